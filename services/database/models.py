@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Date
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, Date, Index
 from sqlalchemy.orm import relationship, sessionmaker, declarative_base
 from datetime import datetime
 import logging
@@ -40,9 +40,9 @@ class Student(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     full_name = Column(String(200), nullable=False, comment='ФИО')
-    direction_id = Column(Integer, ForeignKey('directions.id'), nullable=False, comment='ID направления')
+    direction_id = Column(Integer, ForeignKey('directions.id'), nullable=False, index=True, comment='ID направления')
     speciality_code = Column(String(50), nullable=False, comment='Код специальности')
-    institution_id = Column(Integer, ForeignKey('educational_institutions.id'), nullable=False, comment='ID учебного заведения')
+    institution_id = Column(Integer, ForeignKey('educational_institutions.id'), nullable=False, index=True, comment='ID учебного заведения')
     
     direction = relationship("Direction", back_populates="students")
     institution = relationship("EducationalInstitution", back_populates="students")
@@ -69,7 +69,7 @@ class HourNorm(Base):
     __tablename__ = 'hour_norms'
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    subject_id = Column(Integer, ForeignKey('subjects.id'), nullable=False, comment='ID предмета')
+    subject_id = Column(Integer, ForeignKey('subjects.id'), nullable=False, index=True, comment='ID предмета')
     direction_id = Column(Integer, ForeignKey('directions.id'), nullable=False, comment='ID направления')
     hours = Column(Integer, nullable=False, comment='Часы')
     
@@ -85,11 +85,16 @@ class StudentSubject(Base):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     student_id = Column(Integer, ForeignKey('students.id'), nullable=False, comment='ID студента')
-    subject_id = Column(Integer, ForeignKey('subjects.id'), nullable=False, comment='ID предмета')
+    subject_id = Column(Integer, ForeignKey('subjects.id'), nullable=False, index=True, comment='ID предмета')
     hours = Column(Integer, nullable=False, comment='Часы')
     
     student = relationship("Student", back_populates="student_subjects")
     subject = relationship("Subject", back_populates="student_subjects")
     
     def __repr__(self):
-        return f"<StudentSubject(id={self.id}, student_id={self.student_id}, subject_id={self.subject_id}, hours={self.hours})>"
\ No newline at end of file
+        return f"<StudentSubject(id={self.id}, student_id={self.student_id}, subject_id={self.subject_id}, hours={self.hours})>"
+
+# Составные индексы для выборок по студенту/направлению
+# (покрывают и одиночные поиски по первому столбцу)
+Index('ix_ss_student_subject', StudentSubject.student_id, StudentSubject.subject_id)
+Index('ix_hn_direction_subject', HourNorm.direction_id, HourNorm.subject_id)
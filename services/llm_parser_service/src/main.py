@@ -14,6 +14,7 @@ import time
 import os
 import sys
 import tempfile
+import contextlib
 import logging
 import traceback
 from typing import List, Dict, Optional
@@ -115,11 +116,9 @@ class DiplomaParserService:
             logger.error(f"Error downloading {filename}: {e}")
             return None
         finally:
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except Exception:
-                    pass
+            if temp_path:
+                with contextlib.suppress(OSError):
+                    os.unlink(temp_path)
 
     def get_ocr_text(self, data: Dict) -> Optional[str]:
         """
@@ -177,11 +176,9 @@ class DiplomaParserService:
             logger.info(f"Saved to {bucket}/{object_name} ({file_size} bytes)")
 
         finally:
-            if temp_path and os.path.exists(temp_path):
-                try:
-                    os.remove(temp_path)
-                except Exception:
-                    pass
+            if temp_path:
+                with contextlib.suppress(OSError):
+                    os.unlink(temp_path)
 
     def delete_from_results(self, filename: str):
         """Удаляет один файл из results бакета"""
@@ -1,16 +1,29 @@
 import requests
-import base64
+from requests.adapters import HTTPAdapter
+import binascii
 import time
 import os
-import tempfile
+import io
 import logging
 import traceback
 import sys
+import threading
+import hashlib
+import sqlite3
 from minio import Minio
 from minio.error import S3Error
+from minio.commonconfig import CopySource
+from minio.deleteobjects import DeleteObject
 import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +38,33 @@ sys.setrecursionlimit(1000000)  # Увеличиваем для больших J
 
 logger = logging.getLogger(__name__)
 
+# Размер части при загрузке результатов: до 16 МБ — один PUT вместо multipart
+# (по умолчанию minio-py режет известную длину на части по 5 МБ)
+RESULT_PART_SIZE = 16 * 1024 * 1024
+
+# Повторы запроса к Ollama: временные ответы под нагрузкой и обрывы соединения.
+# Таймаут (600 с) не повторяем — это уже не временная ошибка
+OLLAMA_MAX_ATTEMPTS = 3
+OLLAMA_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+OLLAMA_MAX_BACKOFF = 30
+
+# Верхняя граница ожидания тишины после событий MinIO: settle_seconds * SETTLE_MAX_ROUNDS
+SETTLE_MAX_ROUNDS = 6
+
+
+def loads_json(raw: bytes) -> Any:
+    # orjson парсит байты напрямую, без промежуточной str
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def dump_json_bytes(data: Dict) -> bytes:
+    # Компактный UTF-8 JSON; orjson если установлен, иначе stdlib
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
 class OCRProcessor:
     def __init__(self):
         # Проверка версии MinIO
@@ -49,6 +89,52 @@ class OCRProcessor:
         
         self.ollama_url = "http://ollama:11434/api/generate"
         self.model = "deepseek-ocr"
+        self.prompt = "Describe this image in detail."
+        
+        # Кэш готовых результатов по хэшу изображения: после рестарта папка не OCR-ится заново
+        cache_db_path = os.getenv("OCR_CACHE_DB", "/app/results/ocr_cache.db")
+        self.cache_db = sqlite3.connect(cache_db_path, check_same_thread=False)
+        self.cache_db.execute("PRAGMA journal_mode=WAL")
+        self.cache_db.execute(
+            "CREATE TABLE IF NOT EXISTS done (key TEXT PRIMARY KEY, result BLOB, created_at REAL NOT NULL DEFAULT 0)"
+        )
+        # Старые базы без created_at: их строки получат 0 и уйдут при первой чистке
+        columns = [row[1] for row in self.cache_db.execute("PRAGMA table_info(done)")]
+        if "created_at" not in columns:
+            self.cache_db.execute("ALTER TABLE done ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+        self.cache_db.execute("CREATE INDEX IF NOT EXISTS done_created_at ON done (created_at)")
+        self.cache_db.commit()
+        self.cache_lock = threading.Lock()
+        # Записи старше TTL удаляем не чаще раза в cache_prune_interval секунд
+        self.cache_ttl = int(os.getenv("OCR_CACHE_TTL_DAYS", "30")) * 86400
+        self.cache_prune_interval = 3600
+        self.last_cache_prune = 0.0
+        
+        # Сколько изображений папки отправляем в Ollama параллельно
+        self.concurrency = int(os.getenv("OCR_CONCURRENCY", "2"))
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        # Отдельный пул для коротких серверных операций MinIO (copy и т.п.)
+        self.io_executor = ThreadPoolExecutor(max_workers=8)
+        
+        # Новые файлы приходят событиями MinIO; опрос остаётся как страховка.
+        # settle — сколько секунд тишины ждём, чтобы папка успела загрузиться целиком
+        self.poll_interval = int(os.getenv("OCR_POLL_INTERVAL", "600"))
+        self.settle_seconds = int(os.getenv("OCR_SETTLE_SECONDS", "5"))
+        self.new_objects = threading.Event()
+        # Неудачные переносы в errors по папкам; после max_move_attempts папку оставляем
+        # в source и больше не обрабатываем, чтобы не гонять её в Ollama на каждом проходе
+        self.max_move_attempts = int(os.getenv("OCR_MAX_MOVE_ATTEMPTS", "3"))
+        self.move_failures: Dict[str, int] = {}
+        self.abandoned_folders = set()
+        # Были ли за проход папки, пропущенные как догружающиеся
+        self.settling_skipped = False
+        
+        # Одна сессия на весь процесс: keep-alive соединения к Ollama переиспользуются
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(
+            pool_connections=4, pool_maxsize=max(8, self.concurrency), max_retries=0
+        ))
+        self.session.headers.update({"Content-Type": "application/json"})
         
         self.source_bucket = "documents"
         self.results_bucket = "results"
@@ -68,42 +154,167 @@ class OCRProcessor:
     def list_folders(self) -> List[str]:
         folders = []
         try:
+            # recursive=False — minio-py сам передаёт delimiter="/", папки приходят общими префиксами
             objects = self.minio_client.list_objects(self.source_bucket, recursive=False)
             for obj in objects:
-                if obj.object_name.endswith('/'):
+                if obj.is_dir:
                     folder_name = obj.object_name.rstrip('/')
                     folders.append(folder_name)
         except Exception as e:
             logger.error(f"Error listing folders: {e}")
         return folders
     
-    def list_images(self, folder: str) -> List[str]:
+    def list_folder_entries(self, folder: str) -> List[Any]:
+        # Все объекты папки (с last_modified), включая маркеры каталогов ("folder/")
+        prefix = f"{folder}/"
+        return list(self.minio_client.list_objects(self.source_bucket, prefix=prefix, recursive=True))
+    
+    def list_folder_objects(self, folder: str) -> List[str]:
+        return [obj.object_name for obj in self.list_folder_entries(folder)]
+    
+    def is_folder_settling(self, folder: str, entries: List[Any]) -> bool:
+        # Папка ещё догружается, если какой-то её объект моложе settle_seconds.
+        # Такую папку не трогаем: иначе обработали бы часть страниц, удалили исходники,
+        # а догруженные страницы ушли бы вторым проходом поверх {folder}/ocr_result.json
+        threshold = datetime.now(timezone.utc) - timedelta(seconds=self.settle_seconds)
+        for obj in entries:
+            if obj.last_modified is not None and obj.last_modified > threshold:
+                logger.info(f"Folder {folder} is still being uploaded ({obj.object_name}), skipping for now")
+                self.settling_skipped = True
+                return True
+        return False
+    
+    def list_images(self, folder: str, known_objects: Optional[List[str]] = None) -> List[str]:
         images = []
         try:
-            prefix = f"{folder}/"
-            objects = self.minio_client.list_objects(self.source_bucket, prefix=prefix, recursive=True)
-            for obj in objects:
-                if not obj.object_name.endswith('/'):
-                    images.append(obj.object_name)
+            if known_objects is None:
+                known_objects = self.list_folder_objects(folder)
+            for object_name in known_objects:
+                if not object_name.endswith('/'):
+                    images.append(object_name)
         except Exception as e:
             logger.error(f"Error listing images in {folder}: {e}")
         return images
     
-    def download_image(self, image_path: str) -> Optional[str]:
+    def download_image(self, image_path: str) -> Optional[bytearray]:
+        # Читаем объект сразу в память: без временного файла и повторного чтения с диска
+        response = None
         try:
-            temp_file = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-            temp_path = temp_file.name
-            temp_file.close()
-            
-            self.minio_client.fget_object(self.source_bucket, image_path, temp_path)
-            return temp_path
+            response = self.minio_client.get_object(self.source_bucket, image_path)
+            content_length = response.headers.get("Content-Length")
+            if content_length is None:
+                return bytearray(response.read())
+            
+            size = int(content_length)
+            buffer = bytearray(size)
+            view = memoryview(buffer)
+            offset = 0
+            while offset < size:
+                n = response.readinto(view[offset:])
+                if not n:
+                    raise IOError(f"Unexpected end of stream: {offset}/{size} bytes")
+                offset += n
+            return buffer
         except Exception as e:
             logger.error(f"Error downloading {image_path}: {e}")
             return None
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+    
+    def encode_image_to_base64(self, image_data: bytearray) -> bytes:
+        # base64 одним вызовом C; результат остаётся байтами для тела запроса
+        return binascii.b2a_base64(image_data, newline=False)
+    
+    def build_ollama_body(self, prompt: str, base64_image: bytes) -> bytes:
+        # Сериализуем JSON без картинки, а base64 (только [A-Za-z0-9+/=]) вставляем
+        # как готовый литерал — энкодер не сканирует мегабайты на экранирование
+        head = dump_json_bytes({
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "options": {
+                "temperature": 0.1,
+                "num_predict": 4096
+            }
+        })
+        return b"".join((head[:-1], b',"images":["', base64_image, b'"]}'))
+    
+    def post_to_ollama(self, body: bytes, image_path: str) -> requests.Response:
+        for attempt in range(1, OLLAMA_MAX_ATTEMPTS + 1):
+            last_attempt = attempt == OLLAMA_MAX_ATTEMPTS
+            backoff = min(OLLAMA_MAX_BACKOFF, 2 ** attempt)
+            try:
+                response = self.session.post(
+                    self.ollama_url,
+                    data=body,
+                    timeout=600
+                )
+            except requests.exceptions.ConnectionError as e:
+                if last_attempt:
+                    raise
+                logger.warning(f"Ollama connection error for {image_path} "
+                               f"(attempt {attempt}/{OLLAMA_MAX_ATTEMPTS}): {e}; retry in {backoff}s")
+                time.sleep(backoff)
+                continue
+            
+            if response.status_code in OLLAMA_RETRY_STATUSES and not last_attempt:
+                logger.warning(f"Ollama HTTP {response.status_code} for {image_path} "
+                               f"(attempt {attempt}/{OLLAMA_MAX_ATTEMPTS}); retry in {backoff}s")
+                response.close()
+                time.sleep(backoff)
+                continue
+            
+            return response
+    
+    def get_cache_key(self, image_data: bytearray) -> str:
+        # BLAKE2b от модели, промпта и байтов изображения
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.model.encode())
+        h.update(self.prompt.encode())
+        h.update(image_data)
+        return h.hexdigest()
+    
+    def load_cached_result(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self.cache_lock:
+                row = self.cache_db.execute("SELECT result FROM done WHERE key = ?", (cache_key,)).fetchone()
+            return loads_json(row[0]) if row else None
+        except Exception as e:
+            logger.warning(f"Error reading OCR cache for {cache_key}: {e}")
+            return None
+    
+    def store_cached_result(self, cache_key: str, result: Dict[str, Any]):
+        try:
+            with self.cache_lock:
+                self.cache_db.execute(
+                    "INSERT OR REPLACE INTO done (key, result, created_at) VALUES (?, ?, ?)",
+                    (cache_key, dump_json_bytes(result), time.time())
+                )
+                self.cache_db.commit()
+        except Exception as e:
+            logger.warning(f"Error writing OCR cache for {cache_key}: {e}")
+    
+    def prune_cache(self):
+        now = time.time()
+        if now - self.last_cache_prune < self.cache_prune_interval:
+            return
+        self.last_cache_prune = now
+        try:
+            with self.cache_lock:
+                deleted = self.cache_db.execute(
+                    "DELETE FROM done WHERE created_at < ?", (now - self.cache_ttl,)
+                ).rowcount
+                self.cache_db.commit()
+            if deleted:
+                logger.info(f"Pruned {deleted} expired OCR cache entries")
+        except Exception as e:
+            logger.warning(f"Error pruning OCR cache: {e}")
     
     def process_single_image(self, image_path: str) -> Dict[str, Any]:
-        local_path = self.download_image(image_path)
-        if not local_path:
+        image_data = self.download_image(image_path)
+        if image_data is None:
             return {
                 "image_path": image_path,
                 "error": "Failed to download image",
@@ -112,36 +323,33 @@ class OCRProcessor:
             }
         
         try:
-            with open(local_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
-            prompt = "Describe this image in detail."
-            
-            payload = {
-                "model": self.model,
-                "prompt": prompt,
-                "images": [base64_image],
-                "stream": False,
-                "options": {
-                    "temperature": 0.1,
-                    "num_predict": 4096
-                }
-            }
+            # То же изображение уже распознано (например, до рестарта) — Ollama не нужна
+            cache_key = self.get_cache_key(image_data)
+            cached = self.load_cached_result(cache_key)
+            if cached is not None:
+                logger.info(f"Cache hit for {image_path} ({cache_key})")
+                cached.update(
+                    image_path=image_path,
+                    timestamp=time.strftime("%Y-%m-%d %H:%M:%S"),
+                    cached=True
+                )
+                return cached
+            
+            base64_image = self.encode_image_to_base64(image_data)
+            del image_data
+            
+            body = self.build_ollama_body(self.prompt, base64_image)
+            del base64_image
             
             logger.info(f"Sending to Ollama: {image_path}")
             start_time = time.time()
             
-            response = requests.post(
-                self.ollama_url,
-                json=payload,
-                timeout=600,
-                headers={"Content-Type": "application/json"}
-            )
+            response = self.post_to_ollama(body, image_path)
             
             elapsed = time.time() - start_time
             
             if response.status_code == 200:
-                result = response.json()
+                result = loads_json(response.content)
                 
                 done_reason = result.get('done_reason', 'unknown')
                 ocr_text = result.get('response', '').strip()
@@ -151,7 +359,7 @@ class OCRProcessor:
                 logger.info(f"{'Success' if status == 'success' else 'Partial'} in {elapsed:.1f}s "
                            f"(reason: {done_reason}), text length: {len(ocr_text)}")
                 
-                return {
+                ocr_result = {
                     "image_path": image_path,
                     "ocr_text": ocr_text,
                     "processing_time": elapsed,
@@ -162,6 +370,12 @@ class OCRProcessor:
                     "total_duration": result.get('total_duration', 0),
                     "status": status
                 }
+                
+                # Кэшируем только полностью успешные ответы
+                if status == "success":
+                    self.store_cached_result(cache_key, ocr_result)
+                
+                return ocr_result
             else:
                 logger.error(f"Ollama HTTP error: {response.status_code}")
                 return {
@@ -188,36 +402,26 @@ class OCRProcessor:
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
                 "status": "error"
             }
-        finally:
-            if os.path.exists(local_path):
-                os.remove(local_path)
     
     def save_to_bucket(self, bucket_name: str, folder: str, data: Dict, filename_suffix: str = "result") -> bool:
-        temp_file_path = None
         try:
             result_filename = f"{folder}/ocr_{filename_suffix}.json"
             
-            # Создаем временный файл
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.json', encoding='utf-8', delete=False) as temp_file:
-                temp_file_path = temp_file.name
-                # Записываем JSON с правильными параметрами
-                json.dump(data, temp_file, indent=2, ensure_ascii=False)
-                temp_file.flush()
-                os.fsync(temp_file.fileno())  # Принудительная запись на диск
-            
-            # Проверяем размер файла
-            file_size = os.path.getsize(temp_file_path)
+            # Сериализуем один раз в байты: без временного файла, fsync и повторного чтения.
+            # Размер считаем в байтах UTF-8, а не в символах
+            payload = dump_json_bytes(data)
+            file_size = len(payload)
             logger.info(f"JSON file size: {file_size / 1024:.2f} KB")
             
             # Загружаем в MinIO
-            with open(temp_file_path, 'rb') as file_data:
-                self.minio_client.put_object(
-                    bucket_name,
-                    result_filename,
-                    file_data,
-                    file_size,
-                    content_type="application/json; charset=utf-8"
-                )
+            self.minio_client.put_object(
+                bucket_name,
+                result_filename,
+                io.BytesIO(payload),
+                file_size,
+                content_type="application/json; charset=utf-8",
+                part_size=RESULT_PART_SIZE
+            )
             
             logger.info(f"Saved to {bucket_name}/{result_filename}")
             
@@ -230,13 +434,6 @@ class OCRProcessor:
             logger.error(f"Error saving to {bucket_name}: {e}")
             logger.error(traceback.format_exc())
             return False
-        finally:
-            # Удаляем временный файл
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.remove(temp_file_path)
-                except:
-                    pass
     
     def _verify_saved_file(self, bucket: str, filename: str, expected_size: int) -> bool:
         try:
@@ -254,7 +451,8 @@ class OCRProcessor:
             logger.error(f"Error verifying file {filename}: {e}")
             return False
     
-    def move_folder_to_errors(self, folder: str, results: List[Dict]) -> bool:
+    def move_folder_to_errors(self, folder: str, results: List[Dict],
+                              known_objects: Optional[List[str]] = None) -> bool:
         try:
             error_data = {
                 "folder": folder,
@@ -265,21 +463,15 @@ class OCRProcessor:
             
             self.save_to_bucket(self.errors_bucket, folder, error_data, "errors")
             
-            # Копируем файлы в errors bucket
-            prefix = f"{folder}/"
-            objects = self.minio_client.list_objects(self.source_bucket, prefix=prefix, recursive=True)
+            # Копируем файлы в errors bucket (листинг из process_folder, если передан)
+            if known_objects is None:
+                known_objects = self.list_folder_objects(folder)
             
-            copy_success = True
-            for obj in objects:
-                try:
-                    self.minio_client.copy_object(
-                        self.errors_bucket,
-                        obj.object_name,
-                        f"{self.source_bucket}/{obj.object_name}"
-                    )
-                except Exception as e:
-                    logger.error(f"Error copying {obj.object_name}: {e}")
-                    copy_success = False
+            # Копирование серверное (данные не идут через воркер) — ждём только RTT, поэтому параллельно
+            # Дожидаемся всех копий: all() по ленивому map остановился бы на первой ошибке,
+            # и исходники удалились бы раньше, чем скопированы остальные файлы
+            copy_results = list(self.io_executor.map(self._copy_to_errors, known_objects))
+            copy_success = all(copy_results)
             
             if copy_success:
                 logger.info(f"Moved folder {folder} to errors bucket")
@@ -293,45 +485,68 @@ class OCRProcessor:
             logger.error(traceback.format_exc())
             return False
     
-    def delete_folder_from_source(self, folder: str) -> bool:
+    def move_folder_to_errors_and_delete(self, folder: str, results: List[Dict],
+                                         known_objects: Optional[List[str]] = None) -> bool:
+        if self.move_folder_to_errors(folder, results, known_objects=known_objects):
+            self.move_failures.pop(folder, None)
+            logger.info(f"Deleting folder from source: {folder}")
+            self.delete_folder_from_source(folder, known_objects=known_objects)
+            return True
+        
+        attempts = self.move_failures.get(folder, 0) + 1
+        self.move_failures[folder] = attempts
+        if attempts >= self.max_move_attempts:
+            self.move_failures.pop(folder, None)
+            self.abandoned_folders.add(folder)
+            logger.error(f"Failed to move folder {folder} to errors {attempts} times, "
+                         f"leaving it in source and skipping it until restart")
+        else:
+            logger.error(f"Failed to move folder {folder} to errors "
+                         f"(attempt {attempts}/{self.max_move_attempts}), keeping source")
+        return False
+    
+    def _copy_to_errors(self, object_name: str) -> bool:
+        try:
+            self.minio_client.copy_object(
+                self.errors_bucket,
+                object_name,
+                CopySource(self.source_bucket, object_name)
+            )
+            return True
+        except Exception as e:
+            logger.error(f"Error copying {object_name}: {e}")
+            return False
+    
+    def delete_folder_from_source(self, folder: str, known_objects: Optional[List[str]] = None) -> bool:
         try:
             logger.info(f"=== Starting deletion of folder: {folder} ===")
             
-            prefix = f"{folder}/"
-            logger.info(f"Looking for objects with prefix: {prefix}")
-            
-            # Получаем список объектов
-            objects = []
-            try:
-                objects_iter = self.minio_client.list_objects(
-                    self.source_bucket, 
-                    prefix=prefix, 
-                    recursive=True
-                )
-                objects = list(objects_iter)
-                logger.info(f"Found {len(objects)} objects to delete")
-                
-            except Exception as e:
-                logger.error(f"Error listing objects: {e}")
-                return False
+            # Получаем список объектов, если process_folder его не передал
+            objects = known_objects
+            if objects is None:
+                logger.info(f"Looking for objects with prefix: {folder}/")
+                try:
+                    objects = self.list_folder_objects(folder)
+                except Exception as e:
+                    logger.error(f"Error listing objects: {e}")
+                    return False
+            logger.info(f"Found {len(objects)} objects to delete")
             
             if not objects:
                 logger.info(f"No objects found in folder {folder}")
                 return True
             
-            # Удаляем объекты по одному
-            success_count = 0
+            # Пакетное удаление: remove_objects шлёт DeleteObjects по 1000 ключей за запрос.
+            # Итератор ошибок ленивый — запросы уходят только при его чтении
+            delete_errors = self.minio_client.remove_objects(
+                self.source_bucket,
+                (DeleteObject(obj_name) for obj_name in objects)
+            )
             error_count = 0
-            
-            for obj in objects:
-                try:
-                    obj_name = obj.object_name
-                    self.minio_client.remove_object(self.source_bucket, obj_name)
-                    success_count += 1
-                    logger.debug(f"Deleted: {obj_name}")
-                except Exception as e:
-                    logger.error(f"Error deleting object {obj_name}: {e}")
-                    error_count += 1
+            for error in delete_errors:
+                logger.error(f"Error deleting object {error.name}: {error.code} {error.message}")
+                error_count += 1
+            success_count = len(objects) - error_count
             
             logger.info(f"Deletion summary for {folder}: {success_count} succeeded, {error_count} failed")
             
@@ -344,19 +559,24 @@ class OCRProcessor:
     
     def analyze_results(self, results: List[Dict]) -> Dict[str, Any]:
         total = len(results)
-        success = len([r for r in results if r.get("status") == "success"])
-        partial = len([r for r in results if r.get("status") == "partial"])
-        errors = len([r for r in results if r.get("status") == "error"])
-        
+        partial = 0
+        errors = 0
         success_with_stop = 0
         success_with_length = 0
         
+        # Один проход по результатам вместо трёх списков и отдельного цикла
         for result in results:
-            if result.get("status") == "success":
-                if result.get("done_reason") == "stop":
+            status = result.get("status")
+            if status == "success":
+                done_reason = result.get("done_reason")
+                if done_reason == "stop":
                     success_with_stop += 1
-                elif result.get("done_reason") == "length":
+                elif done_reason == "length":
                     success_with_length += 1
+            elif status == "partial":
+                partial += 1
+            elif status == "error":
+                errors += 1
         
         analysis = {
             "total_images": total,
@@ -374,25 +594,30 @@ class OCRProcessor:
     def process_folder(self, folder: str) -> bool:
         logger.info(f"=== Processing folder: {folder} ===")
         
-        images = self.list_images(folder)
+        # Листинг папки один раз; дальше передаём его в удаление и перенос
+        try:
+            folder_entries = self.list_folder_entries(folder)
+        except Exception as e:
+            logger.error(f"Error listing objects in {folder}: {e}")
+            return False
+        if self.is_folder_settling(folder, folder_entries):
+            return False
+        folder_objects = [obj.object_name for obj in folder_entries]
+        images = self.list_images(folder, known_objects=folder_objects)
         
         if not images:
             logger.warning(f"No images found in folder: {folder}")
-            self.delete_folder_from_source(folder)
+            self.delete_folder_from_source(folder, known_objects=folder_objects)
             return False
         
         logger.info(f"Found {len(images)} images to process")
         
-        results = []
-        
-        for idx, img_path in enumerate(images, 1):
-            logger.info(f"[{idx}/{len(images)}] Processing: {img_path}")
-            
-            result = self.process_single_image(img_path)
-            if result:
-                results.append(result)
-            
-            time.sleep(1)
+        # Изображения независимы; map сохраняет порядок результатов как в папке
+        results = [
+            result
+            for result in self.executor.map(self.process_single_image, images)
+            if result
+        ]
         
         analysis = self.analyze_results(results)
         logger.info(f"Analysis: {analysis}")
@@ -411,7 +636,7 @@ class OCRProcessor:
             
             if save_success:
                 logger.info(f"Deleting folder from source: {folder}")
-                delete_success = self.delete_folder_from_source(folder)
+                delete_success = self.delete_folder_from_source(folder, known_objects=folder_objects)
                 
                 if delete_success:
                     logger.info(f"Successfully deleted source folder: {folder}")
@@ -426,19 +651,47 @@ class OCRProcessor:
         elif analysis["has_length_issues"] or analysis["has_errors"]:
             logger.warning(f"Folder has issues. Moving to errors bucket")
             
-            self.move_folder_to_errors(folder, results)
-            
-            logger.info(f"Deleting folder from source: {folder}")
-            self.delete_folder_from_source(folder)
+            self.move_folder_to_errors_and_delete(folder, results, known_objects=folder_objects)
             
             return False
         
         else:
             logger.error(f"Unexpected analysis result: {analysis}")
-            self.move_folder_to_errors(folder, results)
-            self.delete_folder_from_source(folder)
+            self.move_folder_to_errors_and_delete(folder, results, known_objects=folder_objects)
             return False
     
+    def listen_for_objects(self):
+        # Поток событий s3:ObjectCreated по source_bucket; при обрыве переподключаемся
+        while True:
+            try:
+                with self.minio_client.listen_bucket_notification(
+                    self.source_bucket,
+                    events=["s3:ObjectCreated:*"]
+                ) as events:
+                    logger.info(f"Listening for new objects in {self.source_bucket}")
+                    for event in events:
+                        if event.get("Records"):
+                            self.new_objects.set()
+            except Exception as e:
+                logger.warning(f"Bucket notification stream dropped: {e}")
+            # Пока переподключаемся — пусть цикл перепроверит бакет
+            self.new_objects.set()
+            time.sleep(5)
+    
+    def wait_for_new_objects(self):
+        self.new_objects.wait(timeout=self.poll_interval)
+        # Папка загружается по файлу — ждём, пока события затихнут,
+        # но не дольше нескольких settle: при непрерывных загрузках всё равно пересканируем.
+        # Тишина здесь по всему бакету; недогруженные папки отсекает is_folder_settling
+        deadline = time.monotonic() + self.settle_seconds * SETTLE_MAX_ROUNDS
+        while True:
+            self.new_objects.clear()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if not self.new_objects.wait(timeout=min(self.settle_seconds, remaining)):
+                break
+    
     def run(self):
         logger.info("=== Starting OCR Processor ===")
         
@@ -460,29 +713,38 @@ class OCRProcessor:
         logger.info("  - Any image with 'done_reason: length' or error → errors bucket")
         logger.info("  - Source folder deleted after processing")
         
+        threading.Thread(target=self.listen_for_objects, name="minio-events", daemon=True).start()
+        
         while True:
             try:
+                self.settling_skipped = False
+                self.prune_cache()
                 folders = self.list_folders()
                 
                 if folders:
                     logger.info(f"Found {len(folders)} folders to process")
                 
                 for folder in folders:
+                    if folder in self.abandoned_folders:
+                        continue
                     try:
                         self.process_folder(folder)
                     except Exception as e:
                         logger.error(f"Error processing folder {folder}: {e}")
                         logger.error(traceback.format_exc())
                         try:
-                            self.move_folder_to_errors(folder, [{"error": str(e)}])
-                            self.delete_folder_from_source(folder)
+                            self.move_folder_to_errors_and_delete(folder, [{"error": str(e)}])
                         except Exception as inner_e:
                             logger.error(f"Error in error handling for {folder}: {inner_e}")
                 
                 if not folders:
-                    logger.debug("No folders found. Checking again in 30 seconds...")
+                    logger.debug("No folders found. Waiting for bucket notification...")
                 
-                time.sleep(30)
+                # Пропущенную догружающуюся папку перепроверяем после settle, а не через poll_interval
+                if self.settling_skipped:
+                    self.new_objects.set()
+                
+                self.wait_for_new_objects()
                 
             except KeyboardInterrupt:
                 logger.info("Stopped by user")
@@ -1,16 +1,26 @@
 import requests
+from requests.adapters import HTTPAdapter
 import base64
 import time
 import os
-import tempfile
+import io
 import logging
 import traceback
 import sys
+import hashlib
+import threading
+import urllib3
 from minio import Minio
 from minio.error import S3Error
 import json
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -22,6 +32,18 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# pdf_processor_lite кладёт в бакет только первые страницы в JPEG
+IMAGE_SUFFIX = ".jpg"
+
+
+def dump_json_bytes(data: Dict) -> bytes:
+    """Компактный UTF-8 JSON; orjson если установлен, иначе stdlib."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(
+        data, ensure_ascii=False, separators=(',', ':')
+    ).encode('utf-8')
+
 
 class OCRProcessor:
     def __init__(self):
@@ -38,20 +60,53 @@ class OCRProcessor:
             except Exception:
                 logger.warning("Could not determine MinIO version")
 
+        # Сколько изображений обрабатываем параллельно (запросы к Ollama/MinIO — сетевые)
+        self.concurrency = int(os.getenv("OCR_CONCURRENCY", "4"))
+
+        # Пул соединений не меньше числа потоков, иначе лишние TCP-хендшейки
+        http_client = urllib3.PoolManager(
+            maxsize=max(10, self.concurrency * 2),
+            timeout=urllib3.Timeout(connect=10, read=300),
+            retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+        )
+
         self.minio_client = Minio(
             "minio:9000",
             access_key="ocrminio",
             secret_key="admin123456",
-            secure=False
+            secure=False,
+            http_client=http_client
         )
 
         self.ollama_url = "http://ollama:11434/api/generate"
         self.model = "deepseek-ocr"
+        self.prompt = "Convert the document to txt format."
+
+        # Кэш результатов OCR по содержимому изображения (лежит в volume results)
+        self.cache_dir = os.getenv("OCR_CACHE_DIR", "/app/results/cache")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Файлы кэша старше TTL удаляем не чаще раза в cache_sweep_interval секунд
+        self.cache_ttl = int(os.getenv("OCR_CACHE_TTL_DAYS", "30")) * 86400
+        self.cache_sweep_interval = 3600
+        self.last_cache_sweep = 0.0
 
         self.source_bucket = "documents-lite"
         self.results_bucket = "results"
         self.errors_bucket = "errors"
 
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+
+        # Одна сессия на все потоки: keep-alive соединения к Ollama переиспользуются
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(
+            pool_connections=4, pool_maxsize=max(8, self.concurrency), max_retries=0
+        ))
+        self.session.headers.update({"Content-Type": "application/json"})
+
+        # Новые изображения приходят событиями MinIO; опрос остаётся как страховка
+        self.poll_interval = int(os.getenv("OCR_POLL_INTERVAL", "600"))
+        self.new_images = threading.Event()
+
         self._ensure_buckets()
 
     def _ensure_buckets(self):
@@ -75,13 +130,16 @@ class OCRProcessor:
         """
         images = []
         try:
+            # Только верхний уровень: вложенные ключи MinIO схлопывает в префиксы
             objects = self.minio_client.list_objects(
                 self.source_bucket,
-                recursive=True
+                recursive=False
             )
+            suffix_len = len(IMAGE_SUFFIX)
             for obj in objects:
                 name = obj.object_name
-                if name.lower().endswith('.jpg') and '/' not in name:
+                # Дешёвая проверка первой; lower() только для хвоста имени
+                if '/' not in name and name[-suffix_len:].lower() == IMAGE_SUFFIX:
                     images.append(name)
         except Exception as e:
             logger.error(f"Error listing images: {e}")
@@ -94,29 +152,101 @@ class OCRProcessor:
         """
         return os.path.splitext(image_name)[0]
 
-    def download_image(self, image_name: str) -> Optional[str]:
-        """Скачивает изображение из MinIO во временный файл."""
+    def download_image(self, image_name: str) -> Optional[bytearray]:
+        """
+        Скачивает изображение из MinIO в память.
+        Буфер выделяется один раз по Content-Length и заполняется через readinto.
+        """
+        response = None
         try:
-            temp_file = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-            temp_path = temp_file.name
-            temp_file.close()
-
-            self.minio_client.fget_object(self.source_bucket, image_name, temp_path)
-            return temp_path
+            response = self.minio_client.get_object(self.source_bucket, image_name)
+            content_length = response.headers.get("Content-Length")
+            if content_length is None:
+                return bytearray(response.read())
+
+            size = int(content_length)
+            buffer = bytearray(size)
+            view = memoryview(buffer)
+            offset = 0
+            while offset < size:
+                n = response.readinto(view[offset:])
+                if not n:
+                    raise IOError(f"Unexpected end of stream: {offset}/{size} bytes")
+                offset += n
+            return buffer
         except Exception as e:
-            logger.error(f"Error downloading {image_name}: {e}")
+            logger.error("Error downloading %s: %s", image_name, e)
             return None
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
 
     def delete_image_from_source(self, image_name: str) -> bool:
         """Удаляет одно изображение из source_bucket."""
         try:
             self.minio_client.remove_object(self.source_bucket, image_name)
-            logger.info(f"Deleted from source: {image_name}")
+            logger.info("Deleted from source: %s", image_name)
             return True
         except Exception as e:
-            logger.error(f"Error deleting {image_name} from source: {e}")
+            logger.error("Error deleting %s from source: %s", image_name, e)
             return False
 
+    # ──────────────────────────────────────────────
+    # Кэш OCR по хэшу содержимого
+    # ──────────────────────────────────────────────
+
+    def get_cache_key(self, image_data: bytes) -> str:
+        """BLAKE2b от модели, промпта и байтов изображения."""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.model.encode())
+        h.update(self.prompt.encode())
+        h.update(image_data)
+        return h.hexdigest()
+
+    def load_cached_result(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        cache_path = os.path.join(self.cache_dir, f"{cache_key}.json")
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("Broken cache entry %s: %s", cache_path, e)
+            return None
+
+    def store_cached_result(self, cache_key: str, result: Dict[str, Any]) -> None:
+        """Пишет во временный файл и атомарно переименовывает (потоки не мешают друг другу)."""
+        cache_path = os.path.join(self.cache_dir, f"{cache_key}.json")
+        tmp_path = f"{cache_path}.{os.getpid()}.{id(result)}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(tmp_path, cache_path)
+        except Exception as e:
+            logger.warning("Could not write cache entry %s: %s", cache_path, e)
+
+    def sweep_cache(self) -> None:
+        """Удаляет записи кэша (и брошенные .tmp) старше cache_ttl по mtime."""
+        now = time.time()
+        if now - self.last_cache_sweep < self.cache_sweep_interval:
+            return
+        self.last_cache_sweep = now
+        removed = 0
+        try:
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file() and entry.stat().st_mtime < now - self.cache_ttl:
+                            os.remove(entry.path)
+                            removed += 1
+                    except FileNotFoundError:
+                        continue
+        except Exception as e:
+            logger.warning("Could not sweep cache dir %s: %s", self.cache_dir, e)
+        if removed:
+            logger.info("Removed %d expired cache entries", removed)
+
     # ──────────────────────────────────────────────
     # OCR обработка одного изображения через Ollama
     # ──────────────────────────────────────────────
@@ -126,8 +256,8 @@ class OCRProcessor:
         Скачивает изображение, отправляет в Ollama OCR,
         возвращает результат.
         """
-        local_path = self.download_image(image_name)
-        if not local_path:
+        image_data = self.download_image(image_name)
+        if image_data is None:
             return {
                 "image": image_name,
                 "error": "Failed to download image",
@@ -136,14 +266,24 @@ class OCRProcessor:
             }
 
         try:
-            with open(local_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+            # Такое же изображение уже распознавали — Ollama не нужна
+            cache_key = self.get_cache_key(image_data)
+            cached = self.load_cached_result(cache_key)
+            if cached is not None:
+                logger.info("Cache hit for %s (%s)", image_name, cache_key)
+                cached.update(
+                    image=image_name,
+                    timestamp=time.strftime("%Y-%m-%d %H:%M:%S"),
+                    cached=True
+                )
+                return cached
 
-            prompt = "Convert the document to txt format."
+            base64_image = base64.b64encode(image_data).decode('utf-8')
+            del image_data
 
             payload = {
                 "model": self.model,
-                "prompt": prompt,
+                "prompt": self.prompt,
                 "images": [base64_image],
                 "stream": False,
                 "options": {
@@ -152,14 +292,13 @@ class OCRProcessor:
                 }
             }
 
-            logger.info(f"Sending to Ollama: {image_name}")
+            logger.info("Sending to Ollama: %s", image_name)
             start_time = time.time()
 
-            response = requests.post(
+            response = self.session.post(
                 self.ollama_url,
                 json=payload,
-                timeout=600,
-                headers={"Content-Type": "application/json"}
+                timeout=600
             )
 
             elapsed = time.time() - start_time
@@ -173,11 +312,12 @@ class OCRProcessor:
                 status = "success" if done_reason == 'stop' else "partial"
 
                 logger.info(
-                    f"{'Success' if status == 'success' else 'Partial'} in {elapsed:.1f}s "
-                    f"(reason: {done_reason}), text length: {len(ocr_text)}"
+                    "%s in %.1fs (reason: %s), text length: %d",
+                    'Success' if status == 'success' else 'Partial',
+                    elapsed, done_reason, len(ocr_text)
                 )
 
-                return {
+                ocr_result = {
                     "image": image_name,
                     "ocr_text": ocr_text,
                     "processing_time": elapsed,
@@ -188,8 +328,14 @@ class OCRProcessor:
                     "total_duration": result.get('total_duration', 0),
                     "status": status
                 }
+
+                # Кэшируем только полностью успешные ответы
+                if status == "success":
+                    self.store_cached_result(cache_key, ocr_result)
+
+                return ocr_result
             else:
-                logger.error(f"Ollama HTTP error: {response.status_code}")
+                logger.error("Ollama HTTP error: %s", response.status_code)
                 return {
                     "image": image_name,
                     "error": f"HTTP {response.status_code}",
@@ -198,7 +344,7 @@ class OCRProcessor:
                 }
 
         except requests.exceptions.Timeout:
-            logger.error(f"Timeout processing {image_name} after 600s")
+            logger.error("Timeout processing %s after 600s", image_name)
             return {
                 "image": image_name,
                 "error": "Timeout after 600 seconds",
@@ -206,7 +352,7 @@ class OCRProcessor:
                 "status": "error"
             }
         except Exception as e:
-            logger.error(f"Error processing {image_name}: {e}")
+            logger.error("Error processing %s: %s", image_name, e)
             logger.error(traceback.format_exc())
             return {
                 "image": image_name,
@@ -214,9 +360,6 @@ class OCRProcessor:
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
                 "status": "error"
             }
-        finally:
-            if local_path and os.path.exists(local_path):
-                os.remove(local_path)
 
     # ──────────────────────────────────────────────
     # Сохранение результатов
@@ -226,30 +369,23 @@ class OCRProcessor:
         """
         Сохраняет JSON в указанный бакет.
         object_name — имя файла, например '0001.json'
+        Сериализация один раз в буфер в памяти, без временного файла и fsync.
         """
-        temp_file_path = None
         try:
-            with tempfile.NamedTemporaryFile(
-                mode='w', suffix='.json', encoding='utf-8', delete=False
-            ) as temp_file:
-                temp_file_path = temp_file.name
-                json.dump(data, temp_file, indent=2, ensure_ascii=False)
-                temp_file.flush()
-                os.fsync(temp_file.fileno())
-
-            file_size = os.path.getsize(temp_file_path)
-            logger.info(f"JSON file size: {file_size / 1024:.2f} KB")
-
-            with open(temp_file_path, 'rb') as file_data:
-                self.minio_client.put_object(
-                    bucket_name,
-                    object_name,
-                    file_data,
-                    file_size,
-                    content_type="application/json; charset=utf-8"
-                )
+            # Компактный JSON без отступов: меньше байт и одна запись
+            payload = dump_json_bytes(data)
+            file_size = len(payload)
+            logger.info("JSON file size: %.2f KB", file_size / 1024)
+
+            self.minio_client.put_object(
+                bucket_name,
+                object_name,
+                io.BytesIO(payload),
+                file_size,
+                content_type="application/json; charset=utf-8"
+            )
 
-            logger.info(f"Saved to {bucket_name}/{object_name}")
+            logger.info("Saved to %s/%s", bucket_name, object_name)
 
             # Верификация
             self._verify_saved_file(bucket_name, object_name, file_size)
@@ -257,15 +393,9 @@ class OCRProcessor:
             return True
 
         except Exception as e:
-            logger.error(f"Error saving to {bucket_name}/{object_name}: {e}")
+            logger.error("Error saving to %s/%s: %s", bucket_name, object_name, e)
             logger.error(traceback.format_exc())
             return False
-        finally:
-            if temp_file_path and os.path.exists(temp_file_path):
-                try:
-                    os.remove(temp_file_path)
-                except Exception:
-                    pass
 
     def _verify_saved_file(self, bucket: str, filename: str, expected_size: int) -> bool:
         """Проверяет что файл загрузился корректно."""
@@ -274,16 +404,16 @@ class OCRProcessor:
             actual_size = obj_info.size
 
             if actual_size == expected_size:
-                logger.info(f"File verification passed: {filename} ({actual_size} bytes)")
+                logger.info("File verification passed: %s (%d bytes)", filename, actual_size)
                 return True
             else:
                 logger.error(
-                    f"File size mismatch for {filename}: "
-                    f"expected {expected_size}, got {actual_size}"
+                    "File size mismatch for %s: expected %d, got %d",
+                    filename, expected_size, actual_size
                 )
                 return False
         except Exception as e:
-            logger.error(f"Error verifying file {filename}: {e}")
+            logger.error("Error verifying file %s: %s", filename, e)
             return False
 
     # ──────────────────────────────────────────────
@@ -306,7 +436,7 @@ class OCRProcessor:
         prefix = self.get_prefix_from_image(image_name)
         json_name = f"{prefix}.json"
 
-        logger.info(f"=== Processing image: {image_name} (prefix: {prefix}) ===")
+        logger.info("=== Processing image: %s (prefix: %s) ===", image_name, prefix)
 
         # 1. OCR
         result = self.ocr_image(image_name)
@@ -326,14 +456,15 @@ class OCRProcessor:
         if status == "success" and done_reason == "stop":
             # Всё хорошо → results
             target_bucket = self.results_bucket
-            logger.info(f"✅ OCR successful (reason: stop) → saving to {target_bucket}/{json_name}")
+            logger.info("✅ OCR successful (reason: stop) → saving to %s/%s", target_bucket, json_name)
         else:
             # Проблема → errors
             target_bucket = self.errors_bucket
             reason = result.get("error", f"done_reason={done_reason}, status={status}")
             result_data["error_reason"] = reason
             logger.warning(
-                f"⚠️ OCR issue for {image_name}: {reason} → saving to {target_bucket}/{json_name}"
+                "⚠️ OCR issue for %s: %s → saving to %s/%s",
+                image_name, reason, target_bucket, json_name
             )
 
         # 4. Сохраняем JSON
@@ -341,13 +472,79 @@ class OCRProcessor:
 
         if save_success:
             # 5. Удаляем исходный файл из documents
-            logger.info(f"Deleting source image: {image_name}")
+            logger.info("Deleting source image: %s", image_name)
             self.delete_image_from_source(image_name)
         else:
-            logger.error(f"Failed to save result for {image_name}, keeping source file")
+            logger.error("Failed to save result for %s, keeping source file", image_name)
 
         return status == "success" and done_reason == "stop"
 
+    def process_image_safe(self, image_name: str) -> bool:
+        """
+        process_image с перехватом ошибок: при сбое сохраняет
+        ошибку в errors и удаляет исходник.
+        """
+        try:
+            return self.process_image(image_name)
+        except Exception as e:
+            logger.error("Error processing %s: %s", image_name, e)
+            logger.error(traceback.format_exc())
+
+            # Пытаемся сохранить ошибку и удалить исходник
+            try:
+                prefix = self.get_prefix_from_image(image_name)
+                error_data = {
+                    "prefix": prefix,
+                    "source_image": image_name,
+                    "processed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                    "error_reason": str(e),
+                    "result": {
+                        "image": image_name,
+                        "error": str(e),
+                        "status": "error",
+                        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+                    }
+                }
+                self.save_json_to_bucket(
+                    self.errors_bucket,
+                    f"{prefix}.json",
+                    error_data
+                )
+                self.delete_image_from_source(image_name)
+            except Exception as inner_e:
+                logger.error("Error in error handling for %s: %s", image_name, inner_e)
+            return False
+
+    # ──────────────────────────────────────────────
+    # Уведомления MinIO о новых изображениях
+    # ──────────────────────────────────────────────
+
+    def listen_for_images(self):
+        """
+        Держит поток событий s3:ObjectCreated по source_bucket
+        и будит основной цикл. При обрыве переподключается.
+        """
+        while True:
+            try:
+                with self.minio_client.listen_bucket_notification(
+                    self.source_bucket,
+                    suffix=IMAGE_SUFFIX,
+                    events=["s3:ObjectCreated:*"]
+                ) as events:
+                    logger.info("Listening for new images in %s", self.source_bucket)
+                    for event in events:
+                        records = event.get("Records") or []
+                        if records:
+                            logger.debug(
+                                "New object: %s", records[0]["s3"]["object"]["key"]
+                            )
+                            self.new_images.set()
+            except Exception as e:
+                logger.warning("Bucket notification stream dropped: %s", e)
+            # Пока переподключаемся — пусть цикл перепроверит бакет
+            self.new_images.set()
+            time.sleep(5)
+
     # ──────────────────────────────────────────────
     # Главный цикл
     # ──────────────────────────────────────────────
@@ -377,54 +574,31 @@ class OCRProcessor:
         logger.info("  - done_reason: stop → results bucket (0001.json)")
         logger.info("  - done_reason: length / error → errors bucket (0001.json)")
         logger.info("  - Source image deleted after processing")
+        logger.info(f"  - Up to {self.concurrency} images processed in parallel")
         logger.info("")
         logger.info("Waiting for images to process...")
 
+        threading.Thread(
+            target=self.listen_for_images, name="minio-events", daemon=True
+        ).start()
+
         while True:
             try:
+                # Сбрасываем до листинга, чтобы не потерять события во время обработки
+                self.new_images.clear()
+                self.sweep_cache()
                 images = self.list_images()
 
                 if images:
                     logger.info(f"Found {len(images)} images to process: {images}")
 
-                for image_name in images:
-                    try:
-                        self.process_image(image_name)
-                    except Exception as e:
-                        logger.error(f"Error processing {image_name}: {e}")
-                        logger.error(traceback.format_exc())
-
-                        # Пытаемся сохранить ошибку и удалить исходник
-                        try:
-                            prefix = self.get_prefix_from_image(image_name)
-                            error_data = {
-                                "prefix": prefix,
-                                "source_image": image_name,
-                                "processed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
-                                "error_reason": str(e),
-                                "result": {
-                                    "image": image_name,
-                                    "error": str(e),
-                                    "status": "error",
-                                    "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
-                                }
-                            }
-                            self.save_json_to_bucket(
-                                self.errors_bucket,
-                                f"{prefix}.json",
-                                error_data
-                            )
-                            self.delete_image_from_source(image_name)
-                        except Exception as inner_e:
-                            logger.error(f"Error in error handling for {image_name}: {inner_e}")
-
-                    # Пауза между изображениями
-                    time.sleep(1)
+                # Изображения независимы — обрабатываем пачкой в пуле потоков
+                list(self.executor.map(self.process_image_safe, images))
 
                 if not images:
-                    logger.debug("No images found. Checking again in 30 seconds...")
+                    logger.debug("No images found. Waiting for bucket notification...")
 
-                time.sleep(30)
+                self.new_images.wait(timeout=self.poll_interval)
 
             except KeyboardInterrupt:
                 logger.info("Stopped by user")
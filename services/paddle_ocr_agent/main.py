@@ -1,12 +1,22 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from src.ai_scheduler import recognise
+from src.ai_scheduler import recognise, warmup, start_batch_workers
 from src.models import Image
-from settings import global_settings
+from settings import get_settings
 import json
 import uvicorn
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup()
+    workers = start_batch_workers()
+    yield
+    for task in workers:
+        task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 @app.post("/recognise")
 async def ocr(img: Image):
@@ -19,4 +29,5 @@ async def ocr(img: Image):
     
 if __name__ == "__main__":
     print('staer')
-    uvicorn.run(app=app,host=global_settings.host, port=global_settings.port)
\ No newline at end of file
+    settings = get_settings()
+    uvicorn.run(app=app,host=settings.host, port=settings.port)
\ No newline at end of file
@@ -1,14 +1,20 @@
 from pydantic_settings import BaseSettings,SettingsConfigDict 
 from pydantic import Field
+from functools import lru_cache
 
 
 class Settings(BaseSettings):
     port: int 
     host: str
+    ocr_concurrency: int = 1  # число воркеров пачек; сам predict всё равно идёт по одному
+    ocr_batch_size: int = 8
+    ocr_batch_wait_ms: int = 20
 
     model_config = SettingsConfigDict(
         env_file=".env"
     )
 
-global_settings = Settings()
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
 # print(Settings().model_dump())
\ No newline at end of file
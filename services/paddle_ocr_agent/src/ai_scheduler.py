@@ -1,19 +1,113 @@
 from paddleocr import PaddleOCRVL
 from src.models import Image
+import numpy as np
+from settings import get_settings
 import asyncio
+import logging
+import threading
+from typing import Optional
 
-def ocr(img_path: str):
-    pipeline = PaddleOCRVL()
-    output = pipeline.predict(img_path)
-    for res in output:
-        res.print()
-        res.save_to_json(save_path="output.json")
-        res.save_to_markdown(save_path="output.md")
-        return "{'res': 123}"
+logger = logging.getLogger(__name__)
 
-async def recognise(img: str):
+pipeline = PaddleOCRVL()
+_queue: asyncio.Queue = asyncio.Queue()
+# Пайплайн не рассчитан на параллельные вызовы predict: при ocr_concurrency > 1
+# воркеры пересекаются только на сборе пачек и раздаче результатов
+_predict_lock = threading.Lock()
+
+def warmup():
+    blank = np.full((64, 64, 3), 255, dtype=np.uint8)
+    with _predict_lock:
+        for _ in pipeline.predict(blank):
+            pass
+
+def _format_result(res) -> str:
+    res.print()
+    res.save_to_json(save_path="output.json")
+    res.save_to_markdown(save_path="output.md")
+    return "{'res': 123}"
+
+def ocr(img_paths: list[str]) -> list[Optional[str]]:
+    # Результаты идут в порядке входов; у многостраничного PDF их несколько подряд
+    # (page_index 0, 1, ...). Новый вход начинается с page_index None (картинка) или 0 —
+    # берём его первый результат, как раньше. input_path не используем: для URL там
+    # локальный путь скачанного файла
+    results: list[Optional[str]] = [None] * len(img_paths)
+    idx = -1
+    with _predict_lock:
+        for res in pipeline.predict(img_paths):
+            if res.get("page_index") in (None, 0):
+                idx += 1
+                if idx < len(results):
+                    results[idx] = _format_result(res)
+    return results
+
+def ocr_single(img_path: str) -> str:
+    with _predict_lock:
+        for res in pipeline.predict(img_path):
+            return _format_result(res)
+    raise RuntimeError(f"No OCR result for {img_path}")
+
+async def _collect_batch() -> list:
+    # Ждём первый запрос, затем добираем пачку не дольше ocr_batch_wait_ms
+    batch = [await _queue.get()]
+    loop = asyncio.get_running_loop()
+    settings = get_settings()
+    deadline = loop.time() + settings.ocr_batch_wait_ms / 1000
+    while len(batch) < settings.ocr_batch_size:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(await asyncio.wait_for(_queue.get(), timeout))
+        except asyncio.TimeoutError:
+            break
+    return batch
+
+async def _process_batch(batch: list):
+    unique_imgs = list(dict.fromkeys(img for img, _ in batch))
     try:
-        res = ocr(img)
-    except Exception as e:
-        raise e
-    return res
\ No newline at end of file
+        batch_results = await asyncio.to_thread(ocr, unique_imgs)
+    except Exception:
+        # Ошибка одного входа не должна валить соседей по пачке — ниже повторим поштучно
+        batch_results = [None] * len(unique_imgs)
+    results = {img: res for img, res in zip(unique_imgs, batch_results) if res is not None}
+    for img, fut in batch:
+        # Запрос могли отменить, пока шло распознавание — set_* на нём бросит InvalidStateError
+        if fut.done():
+            continue
+        if img not in results:
+            try:
+                results[img] = await asyncio.to_thread(ocr_single, img)
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+                continue
+        if not fut.done():
+            fut.set_result(results[img])
+
+async def _batch_worker():
+    while True:
+        batch = []
+        try:
+            batch = await _collect_batch()
+            await _process_batch(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Воркер не должен умирать молча — иначе recognise() зависнет навсегда
+            logger.exception("OCR batch worker error")
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+
+def start_batch_workers() -> list[asyncio.Task]:
+    return [
+        asyncio.create_task(_batch_worker())
+        for _ in range(get_settings().ocr_concurrency)
+    ]
+
+async def recognise(img: str):
+    fut = asyncio.get_running_loop().create_future()
+    await _queue.put((img, fut))
+    return await fut
@@ -1,6 +1,8 @@
 import os
 import io
 import tempfile
+import asyncio
+import threading
 from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -37,6 +39,10 @@ try:
 except S3Error as e:
     logger.error(f"Ошибка при создании bucket: {e}")
 
+# PyMuPDF не потокобезопасен: вызовы fitz выполняем строго по одному,
+# параллельно идёт только загрузка в MinIO
+FITZ_LOCK = threading.Lock()
+
 app = FastAPI(title="PDF Processor API")
 
 app.add_middleware(
@@ -68,13 +74,15 @@ def pdf_to_images(pdf_content: bytes, pdf_id: str, pdf_filename: str) -> Process
     
     try:
         # Открываем PDF из байтов
-        pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
-        total_pages = len(pdf_document)
+        with FITZ_LOCK:
+            pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
+            total_pages = len(pdf_document)
         
         logger.info(f"Обработка PDF '{pdf_filename}': {total_pages} страниц")
         
         if total_pages == 0:
-            pdf_document.close()
+            with FITZ_LOCK:
+                pdf_document.close()
             return ProcessingResult(
                 pdf_id=pdf_id,
                 pdf_name=pdf_filename,
@@ -88,11 +96,12 @@ def pdf_to_images(pdf_content: bytes, pdf_id: str, pdf_filename: str) -> Process
         
         # Обрабатываем каждую страницу
         for page_num in range(total_pages):
-            page = pdf_document.load_page(page_num)
-            
-            # Получаем изображение страницы
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # Увеличиваем DPI для качества
-            img_data = pix.tobytes("jpeg")
+            with FITZ_LOCK:
+                page = pdf_document.load_page(page_num)
+                
+                # Получаем изображение страницы
+                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # Увеличиваем DPI для качества
+                img_data = pix.tobytes("jpeg")
             
             # Создаем имя файла для изображения
             image_name = f"{pdf_id}/{page_num + 1}.jpg"
@@ -113,7 +122,8 @@ def pdf_to_images(pdf_content: bytes, pdf_id: str, pdf_filename: str) -> Process
             except S3Error as e:
                 logger.error(f"Ошибка при загрузке в MinIO: {e}")
         
-        pdf_document.close()
+        with FITZ_LOCK:
+            pdf_document.close()
         
         return ProcessingResult(
             pdf_id=pdf_id,
@@ -137,7 +147,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     try:
-        minio_client.list_buckets()
+        await asyncio.to_thread(minio_client.list_buckets)
         return {"status": "healthy", "minio": "connected", "timestamp": datetime.now().isoformat()}
     except Exception as e:
         return {"status": "unhealthy", "minio": "disconnected", "error": str(e)}
@@ -164,7 +174,7 @@ async def process_pdf(
         
         pdf_id = str(uuid.uuid4())
         
-        result = pdf_to_images(contents, pdf_id, file.filename)
+        result = await asyncio.to_thread(pdf_to_images, contents, pdf_id, file.filename)
         
         return result
         
@@ -201,7 +211,7 @@ async def process_multiple_pdfs(files: List[UploadFile] = File(...)):
                 continue
             
             pdf_id = str(uuid.uuid4())
-            result = pdf_to_images(contents, pdf_id, file.filename)
+            result = await asyncio.to_thread(pdf_to_images, contents, pdf_id, file.filename)
             results.append(result.dict())
             
         except Exception as e:
@@ -217,22 +227,29 @@ async def process_multiple_pdfs(files: List[UploadFile] = File(...)):
         "errors": errors
     }
 
+def list_pdf_objects(pdf_id: str) -> List[dict]:
+    """
+    Синхронно перебирает изображения PDF (листинг MinIO — блокирующие HTTP-запросы).
+    """
+    objects = minio_client.list_objects(
+        MINIO_BUCKET,
+        prefix=f"{pdf_id}/",
+        recursive=True
+    )
+    
+    images = []
+    for obj in objects:
+        images.append({
+            "name": obj.object_name,
+            "size": obj.size,
+            "last_modified": obj.last_modified.isoformat() if obj.last_modified else None
+        })
+    return images
+
 @app.get("/api/list-images/{pdf_id}")
 async def list_pdf_images(pdf_id: str):
     try:
-        objects = minio_client.list_objects(
-            MINIO_BUCKET,
-            prefix=f"{pdf_id}/",
-            recursive=True
-        )
-        
-        images = []
-        for obj in objects:
-            images.append({
-                "name": obj.object_name,
-                "size": obj.size,
-                "last_modified": obj.last_modified.isoformat() if obj.last_modified else None
-            })
+        images = await asyncio.to_thread(list_pdf_objects, pdf_id)
         
         return {
             "pdf_id": pdf_id,
@@ -1,6 +1,8 @@
 import os
 import io
 import re
+import asyncio
+import threading
 from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -35,6 +37,10 @@ try:
 except S3Error as e:
     logger.error(f"Ошибка при создании bucket: {e}")
 
+# PyMuPDF не потокобезопасен: рендер выполняем строго по одному,
+# параллельно идёт только загрузка в MinIO
+FITZ_LOCK = threading.Lock()
+
 app = FastAPI(title="PDF Processor API")
 
 app.add_middleware(
@@ -103,17 +109,28 @@ def pdf_first_page_to_image(
     image_object_name = f"{prefix}.jpg"
 
     try:
-        # 2. Открываем PDF
-        pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
-        total_pages = len(pdf_document)
+        with FITZ_LOCK:
+            # 2. Открываем PDF
+            pdf_document = fitz.open(stream=pdf_content, filetype="pdf")
+            total_pages = len(pdf_document)
+
+            logger.info(
+                f"Обработка PDF '{pdf_filename}': {total_pages} страниц, "
+                f"префикс='{prefix}'"
+            )
 
-        logger.info(
-            f"Обработка PDF '{pdf_filename}': {total_pages} страниц, "
-            f"префикс='{prefix}'"
-        )
+            img_data = None
+            if total_pages > 0:
+                # 3. Берём ТОЛЬКО первую страницу (индекс 0)
+                page = pdf_document.load_page(0)
+
+                # 4. Рендерим в изображение (2x масштаб ≈ 144 DPI)
+                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+                img_data = pix.tobytes("jpeg")
 
-        if total_pages == 0:
             pdf_document.close()
+
+        if img_data is None:
             return ProcessingResult(
                 pdf_name=pdf_filename,
                 extracted_prefix=prefix,
@@ -123,15 +140,6 @@ def pdf_first_page_to_image(
                 message="PDF файл не содержит страниц"
             )
 
-        # 3. Берём ТОЛЬКО первую страницу (индекс 0)
-        page = pdf_document.load_page(0)
-
-        # 4. Рендерим в изображение (2x масштаб ≈ 144 DPI)
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-        img_data = pix.tobytes("jpeg")
-
-        pdf_document.close()
-
         # 5. Загружаем в MinIO
         minio_client.put_object(
             bucket_name=MINIO_BUCKET,
@@ -174,6 +182,29 @@ def pdf_first_page_to_image(
         )
 
 
+def list_bucket_images() -> List[dict]:
+    """
+    Синхронно перебирает объекты бакета (листинг MinIO — блокирующие HTTP-запросы).
+    """
+    objects = minio_client.list_objects(
+        MINIO_BUCKET,
+        recursive=True
+    )
+
+    images = []
+    for obj in objects:
+        if obj.object_name.lower().endswith('.jpg'):
+            images.append({
+                "name": obj.object_name,
+                "size": obj.size,
+                "last_modified": (
+                    obj.last_modified.isoformat()
+                    if obj.last_modified else None
+                )
+            })
+    return images
+
+
 # ────────────────────────── ENDPOINTS ──────────────────────────
 
 @app.get("/")
@@ -184,7 +215,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     try:
-        minio_client.list_buckets()
+        await asyncio.to_thread(minio_client.list_buckets)
         return {
             "status": "healthy",
             "minio": "connected",
@@ -226,7 +257,10 @@ async def process_pdf(
                 detail="PDF файл пустой"
             )
 
-        result = pdf_first_page_to_image(contents, file.filename)
+        # Рендер и загрузка в MinIO блокирующие — выполняем вне event loop
+        result = await asyncio.to_thread(
+            pdf_first_page_to_image, contents, file.filename
+        )
         return result
 
     except HTTPException:
@@ -266,7 +300,9 @@ async def process_multiple_pdfs(files: List[UploadFile] = File(...)):
                 })
                 continue
 
-            result = pdf_first_page_to_image(contents, file.filename)
+            result = await asyncio.to_thread(
+                pdf_first_page_to_image, contents, file.filename
+            )
             results.append(result.dict())
 
         except HTTPException as e:
@@ -294,22 +330,7 @@ async def list_all_images():
     Выводит список всех изображений в бакете.
     """
     try:
-        objects = minio_client.list_objects(
-            MINIO_BUCKET,
-            recursive=True
-        )
-
-        images = []
-        for obj in objects:
-            if obj.object_name.lower().endswith('.jpg'):
-                images.append({
-                    "name": obj.object_name,
-                    "size": obj.size,
-                    "last_modified": (
-                        obj.last_modified.isoformat()
-                        if obj.last_modified else None
-                    )
-                })
+        images = await asyncio.to_thread(list_bucket_images)
 
         return {
             "bucket": MINIO_BUCKET,
@@ -1,4 +1,5 @@
 import os
+import contextlib
 import shutil
 from typing import List, Optional
 
@@ -97,11 +98,8 @@ class MinioClient:
 
     def cleanup_temp_file(self, local_path: str) -> None:
         """Удалить временный файл"""
-        try:
-            if os.path.exists(local_path):
-                os.remove(local_path)
-        except OSError:
-            pass
+        with contextlib.suppress(OSError):
+            os.unlink(local_path)
 
     def cleanup_temp_dir(self) -> None:
         """Очистить всю временную директорию"""